@@ -17,12 +17,9 @@ def main(config):
     config.img_dir_path = os.path.join(config.saving_dir, 'img_dir')
 
     # Create directories if not exist
-    if not os.path.exists(config.log_dir_path):
-        os.makedirs(config.log_dir_path)
-    if not os.path.exists(config.data_dir_path):
-        os.makedirs(config.data_dir_path)
-    if not os.path.exists(config.img_dir_path):
-        os.makedirs(config.img_dir_path)
+    os.makedirs(config.log_dir_path, exist_ok=True)
+    os.makedirs(config.data_dir_path, exist_ok=True)
+    os.makedirs(config.img_dir_path, exist_ok=True)
 
     
     # Logger
@@ -1,8 +1,15 @@
 from qiskit.quantum_info import SparsePauliOp
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import networkx as nx
 import numpy as np
-from qutip import Qobj
-from qiskit.quantum_info import Statevector,Operator
+from scipy.linalg import eigh
+import scipy.sparse as sparse
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 def get_heisenberg_hamiltonian(graph,Jxy=1.,Jz=1.,hz=0.):
     """Returns the hamiltonian in the case where hl=hr. Here the value of the field is ap."""
@@ -23,8 +30,9 @@ def get_heisenberg_hamiltonian(graph,Jxy=1.,Jz=1.,hz=0.):
         coeff = ('YY',[i,j],Jxy)
         sparse_list.append(coeff)
 
-    
-    hamiltonian = SparsePauliOp.from_sparse_list(sparse_list,num_qubits=num_qubits).simplify()
+
+    # the (pauli, sites) terms are unique on a simple graph, no need to simplify()
+    hamiltonian = SparsePauliOp.from_sparse_list(sparse_list,num_qubits=num_qubits)
     return hamiltonian
 
 def get_line_graph(n_qubits):
@@ -40,41 +48,151 @@ def get_line_graph(n_qubits):
     graph_line.add_edges_from(edge_list)
     return graph_line
 
-def get_mag_z_op(graph):
-    
-    num_qubits = len(graph.nodes())
-    sparse_list = []
-    # Uniform Z and X fields
-    for qubit in graph.nodes():
-        coeff = ('Z',[qubit],1)
-        sparse_list.append(coeff)
+PAULIS = {'I': sparse.identity(2,dtype=complex,format='csr'),
+          'X': sparse.csr_matrix(np.array([[0.,1.],[1.,0.]],dtype=complex)),
+          'Y': sparse.csr_matrix(np.array([[0.,-1.j],[1.j,0.]])),
+          'Z': sparse.csr_matrix(np.array([[1.,0.],[0.,-1.]],dtype=complex))}
 
-    mag = SparsePauliOp.from_sparse_list(sparse_list,num_qubits=num_qubits)/num_qubits
-    return mag
+@functools.lru_cache(maxsize=64)
+def kron_embed(pauli,qubit,num_qubits):
+    """Returns I x ... x sigma x ... x I as a CSR matrix, in the little-endian order of qiskit.
 
-def get_mag_x_op(graph):
-    
+    Cached, since `heisenberg_csr` needs the same embeddings for each coupling; each entry holds
+    2**num_qubits nonzeros, so the cache is bounded to the 3*num_qubits entries of a few chains.
+    """
+    left = sparse.identity(2**(num_qubits-qubit-1),dtype=complex,format='csr')
+    right = sparse.identity(2**qubit,dtype=complex,format='csr')
+    return sparse.kron(left,sparse.kron(PAULIS[pauli],right),format='csr')
+
+def get_uniform_mag_op(graph,pauli):
+    """Returns (1/N) sum_i sigma_i as a SparsePauliOp."""
     num_qubits = len(graph.nodes())
-    sparse_list = []
-    # Uniform Z and X fields
-    for qubit in graph.nodes():
-        coeff = ('X',[qubit],1)
-        sparse_list.append(coeff)
+    sparse_list = [(pauli,[qubit],1) for qubit in graph.nodes()]
+    return SparsePauliOp.from_sparse_list(sparse_list,num_qubits=num_qubits)/num_qubits
+
+def heisenberg_csr(L,Jxy=1.,Jz=1.,hz=0.):
+    """Same hamiltonian as get_heisenberg_hamiltonian on a line graph, assembled as a CSR matrix."""
+    hamiltonian = sparse.csr_matrix((2**L,2**L),dtype=complex)
+    for i in range(L):
+        hamiltonian = hamiltonian + hz*kron_embed('Z',i,L)
+    for i in range(L-1):
+        hamiltonian = hamiltonian + Jz*(kron_embed('Z',i,L) @ kron_embed('Z',i+1,L))
+        hamiltonian = hamiltonian + Jxy*(kron_embed('X',i,L) @ kron_embed('X',i+1,L))
+        hamiltonian = hamiltonian + Jxy*(kron_embed('Y',i,L) @ kron_embed('Y',i+1,L))
+    return hamiltonian
+
+def get_mag_z_op(graph):
+    return get_uniform_mag_op(graph,'Z')
 
-    mag = SparsePauliOp.from_sparse_list(sparse_list,num_qubits=num_qubits)/num_qubits
-    return mag
+def get_mag_x_op(graph):
+    return get_uniform_mag_op(graph,'X')
 
 def get_mag_y_op(graph):
-    
-    num_qubits = len(graph.nodes())
-    sparse_list = []
-    # Uniform Z and X fields
-    for qubit in graph.nodes():
-        coeff = ('Y',[qubit],1)
-        sparse_list.append(coeff)
+    return get_uniform_mag_op(graph,'Y')
+
+# (x bit, z bit, number of Y) of the single-qubit Paulis, Y = i X Z
+PAULI_BITS = {'X': (1,0,0), 'Y': (1,1,1), 'Z': (0,1,0)}
+
+@functools.lru_cache(maxsize=None)
+def site_pauli_masks(L):
+    """Returns {(pauli,qubit): (x_mask,z_mask,y_count)} for all single-site Paulis of L qubits."""
+    masks = {}
+    for pauli in 'XYZ':
+        x_bit,z_bit,y_count = PAULI_BITS[pauli]
+        for qubit in range(L):
+            masks[(pauli,qubit)] = (x_bit << qubit,z_bit << qubit,y_count)
+    return masks
+
+def _parity(arr):
+    """Parity of the number of set bits of each entry of an integer array."""
+    arr = np.array(arr,dtype=np.int64)
+    for shift in (32,16,8,4,2,1):
+        arr ^= arr >> shift
+    return arr & 1
+
+if numba is None:
+    _pauli_expvals_numba = None
+else:
+    @numba.njit(cache=True)
+    def _parity_int(v):
+        for shift in (32,16,8,4,2,1):
+            v ^= v >> shift
+        return v & 1
+
+    @numba.njit(cache=True)
+    def _phase_real(re,im,y_count):
+        """Real part of i**y_count * (re + i*im)."""
+        y = y_count % 4
+        if y == 0:
+            return re
+        if y == 1:
+            return -im
+        if y == 2:
+            return -re
+        return im
+
+    @numba.njit(parallel=True,fastmath=True,cache=True)
+    def _pauli_expvals_numba(psi_t,masks):
+        """out[k,t] = <psi_t[t]|P_k|psi_t[t]> for rows (x_mask,z_mask,y_count) of `masks`.
+
+        The threads are spread over all (Pauli, time) pairs, each pair is a serial pass over psi.
+        """
+        n_terms = masks.shape[0]
+        nt,dim = psi_t.shape
+        out = np.empty((n_terms,nt))
+        for job in numba.prange(n_terms*nt):
+            k = job // nt
+            t = job % nt
+            x_mask = masks[k,0]
+            z_mask = masks[k,1]
+            re = 0.
+            im = 0.
+            for i in range(dim):
+                j = i ^ x_mask
+                s = 1 - 2*_parity_int(j & z_mask)
+                amp = psi_t[t,i].conjugate()*psi_t[t,j]
+                re += s*amp.real
+                im += s*amp.imag
+            out[k,t] = _phase_real(re,im,masks[k,2])
+        return out
+
+def _pauli_expval_numpy(psi,psi_conj,idx,x_mask,z_mask,y_count):
+    """Returns <psi|P|psi> for the Pauli string P defined by its x/z bitmasks and number of Y.
 
-    mag = SparsePauliOp.from_sparse_list(sparse_list,num_qubits=num_qubits)/num_qubits
-    return mag
+    Acts on the last axis of `psi`, such that a whole time series of states is handled at once.
+    """
+    target = idx ^ x_mask
+    sign = 1 - 2*_parity(target & z_mask)
+    phase = 1.j**(y_count % 4)
+    return (phase*np.sum(psi_conj*sign*psi[...,target],axis=-1)).real
+
+def magnetizations(psi_t,L):
+    """Returns mags[a,t] = <psi(t)|(1/L) sum_i sigma^a_i|psi(t)> for a = x,y,z.
+
+    With numba, a single parallel kernel evaluates all 3*L single-site Paulis at all times.
+    Otherwise x, y and z are evaluated in three threads (numpy releases the GIL), which all reuse
+    the same conjugated `psi_t` and index array.
+    """
+    masks = site_pauli_masks(L)
+    if _pauli_expvals_numba is not None:
+        mask_array = np.array([masks[(pauli,qubit)] for pauli in 'XYZ' for qubit in range(L)],
+                              dtype=np.int64)
+        rows = np.ascontiguousarray(psi_t).reshape(-1,psi_t.shape[-1])
+        vals = _pauli_expvals_numba(rows,mask_array)
+        return vals.reshape((3,L)+psi_t.shape[:-1]).sum(axis=1)/L
+
+    psi_conj = psi_t.conj()
+    idx = np.arange(psi_t.shape[-1])
+
+    def mag(pauli):
+        res = np.zeros(psi_t.shape[:-1])
+        for qubit in range(L):
+            res += _pauli_expval_numpy(psi_t,psi_conj,idx,*masks[(pauli,qubit)])
+        return res
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        mags = list(executor.map(mag,'XYZ'))
+    return np.array(mags)/L
 
 def get_hamiltonian_magkink(graph,J=1.,hx=0.5,hz=0.,ap=0.):
     """Returns the hamiltonian in the case where hl=hr. Here the value of the field is ap."""
@@ -104,46 +222,58 @@ def get_hamiltonian_magkink(graph,J=1.,hx=0.5,hz=0.,ap=0.):
     return hamiltonian
 
 def replace_below_threshold(arr, threshold=1e-12):
-    """Takes off near-zero values of an array"""
-    # Convert to a NumPy array if not already one
-    arr = np.array(arr)
-    
-    # Find the indices of elements with absolute value below the threshold
-    low_values_indices = np.abs(arr) < threshold
-    
-    # Replace these elements with zero
-    arr[low_values_indices] = 0
-    
+    """Takes off near-zero values of an array (in place if `arr` already is an ndarray)"""
+    arr = np.asarray(arr)
+    np.putmask(arr, np.abs(arr) < threshold, 0)
     return arr
 
 def get_eigen_decomposition(hamiltonian):
-    ham_qutip = Qobj(hamiltonian.real)
-    eigvals,eigvecs = ham_qutip.eigenstates()
+    eigvals,eigvecs = eigh(hamiltonian.real)
     eig_vals = replace_below_threshold(eigvals)
-    eig_matrix = replace_below_threshold(np.column_stack([e.full().real for e in eigvecs]))
+    eig_matrix = replace_below_threshold(eigvecs)
+
+    return eig_vals,eig_matrix
+
+@functools.lru_cache(maxsize=2)
+def _diagonalize_heisenberg(L,Jxy,Jz,hz):
+    """Cached (float64) eigendecomposition of the Heisenberg chain; the arrays are read-only.
 
+    The dense eigenvectors take 8*4**L bytes (128 MB at L=12), so only the last two parameter
+    sets are kept: enough to reuse the decomposition for repeated calls (e.g. single and double
+    precision), without holding on to gigabytes of memory.
+    """
+    heisenberg_hamiltonian = heisenberg_csr(L,Jxy=Jxy,Jz=Jz,hz=hz)
+    eig_vals,eig_matrix = get_eigen_decomposition(heisenberg_hamiltonian.toarray())
+    eig_vals.flags.writeable = False
+    eig_matrix.flags.writeable = False
     return eig_vals,eig_matrix
 
-def get_exact_mags(L = 8, Jxy = -0.1,Jz = -0.5,hz = 0.7):
-    graph=get_line_graph(L)
-    heisenberg_hamiltonian = get_heisenberg_hamiltonian(graph,Jxy=Jxy,Jz=Jz,hz=hz)
-    eig_vals,eig_matrix = get_eigen_decomposition(heisenberg_hamiltonian.to_matrix())
-    initial_state = Statevector.from_label('+'* L)
+def get_exact_mags(L = 8, Jxy = -0.1,Jz = -0.5,hz = 0.7,single_precision=None):
+    """Exact time evolution of the magnetizations starting from |+>^L.
 
-    mag_z = get_mag_z_op(graph)
-    mag_x = get_mag_x_op(graph)
-    mag_y = get_mag_y_op(graph)
+    `single_precision` evolves in complex64, which halves the memory traffic at ~1e-7 relative
+    precision (plenty for comparing to TEBD). Defaults to True for L >= 12, where the
+    eigenvector matrix no longer fits in cache.
+    """
+    if single_precision is None:
+        single_precision = L >= 12
+    dtype = np.complex64 if single_precision else np.complex128
+    eig_vals,eig_matrix = _diagonalize_heisenberg(L,Jxy,Jz,hz)
+    if single_precision:
+        eig_matrix = eig_matrix.astype(np.float32)
+    # |+>^L has all amplitudes equal
+    psi0 = np.full(2**L,2**(-L/2),dtype=dtype)
 
-    mags_z = []
-    mags_x = []
-    mags_y = []
     times = np.linspace(0,20,100)
-    for t in times:
-        # U = Operator(expm(-1.j*t*heisenberg_hamiltonian.to_matrix()))
-        U = Operator(eig_matrix @ np.diag(np.exp(-1.j*t*eig_vals)) @ eig_matrix.T)
-        evolved_state = initial_state.evolve(U)
-        
-        mags_x.append(evolved_state.expectation_value(mag_x).real)
-        mags_y.append(evolved_state.expectation_value(mag_y).real)
-        mags_z.append(evolved_state.expectation_value(mag_z).real)
+    # project onto the eigenbasis once and evolve all times in a single batched product
+    c0 = eig_matrix.conj().T @ psi0
+    # phases[t,a] = exp(-i t E_a) c0[a], computed in place on a single (Nt, 2**L) buffer
+    # (t E is evaluated in float64 and only the result is stored in `dtype`)
+    phases = np.empty((len(times),len(eig_vals)),dtype=dtype)
+    np.multiply.outer(times,-1.j*eig_vals,out=phases)
+    np.exp(phases,out=phases)
+    phases *= c0
+    psi_t = phases @ eig_matrix.T
+
+    mags_x,mags_y,mags_z = magnetizations(psi_t,L)
     return times,mags_x,mags_y,mags_z
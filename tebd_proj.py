@@ -1,6 +1,7 @@
 import logging
 from tenpy.models.xxz_chain import XXZChain
 from tenpy.algorithms import my_tebd as tebd
+from tenpy.algorithms.tebd_clifford import allocate_data, measurement
 import numpy as np
 from tenpy.linalg import np_conserved as npc
 from tenpy.networks.mps import MPS
@@ -81,30 +82,18 @@ cnot_gate = np.array([[1, 0, 0, 0],
 # eng = tebd.TEBDEngine(psi, model, tebd_params)
 eng = tebd.TEBDEngine(psi, model, tebd_params,clifford=None,clifford_step=10)
 
-def measurement(eng, data):
-    keys = ['t', 'Sx', 'Sy', 'Sz', 'trunc_err','entropy']
-    if data is None:
-        data = dict([(k, []) for k in keys])
-    data['t'].append(eng.evolved_time)
-    data['Sx'].append(eng.psi.expectation_value('Sigmax'))
-    data['Sy'].append(eng.psi.expectation_value('Sigmay'))
-    data['Sz'].append(eng.psi.expectation_value('Sigmaz'))
-    data['entropy'].append(eng.psi.entanglement_entropy())
-    data['trunc_err'].append(eng.trunc_err.eps)
-    return data
-
-data = measurement(eng, None)
-while eng.evolved_time < 20.:
+evol_time = 20.
+n_meas = int(round(evol_time / (tebd_params['dt'] * tebd_params['N_steps']))) + 1
+data = allocate_data(n_meas, L)
+
+measurement(eng, data, 0)
+for k in range(1, n_meas):
     eng.run()
-    measurement(eng, data)
+    measurement(eng, data, k)
 
-mx = []
-my = []
-mz = []
-for i in range(len(data['Sx'])):
-    mx.append(np.sum(data['Sx'][i]))
-    my.append(np.sum(data['Sy'][i]))
-    mz.append(np.sum(data['Sz'][i]))
+mx = data['Sx'].sum(axis=1)
+my = data['Sy'].sum(axis=1)
+mz = data['Sz'].sum(axis=1)
 
 times,exact_mx,exact_my,exact_mz = get_exact_mags(L=L)
 
@@ -118,6 +107,6 @@ ax[0].plot(times,exact_mz,label='z exact')
 ax[0].legend()
 ax[0].set_xlabel('time $t$')
 
-ax[1].plot(data['t'], np.array(data['entropy'])[:, L//2])
+ax[1].plot(data['t'], data['entropy'][:, L//2])
 
 plt.savefig('plots.pdf',format='pdf')
\ No newline at end of file
@@ -1,4 +1,5 @@
 
+import os
 import numpy as np
 import time
 import typing
@@ -12,12 +13,59 @@ from tenpy.models.lattice import Chain
 from tenpy.networks.mps import MPS
 
 from .algorithm import TimeEvolutionAlgorithm, TimeDependentHAlgorithm
+from . import my_tebd as tebd
 from ..linalg import np_conserved as npc
 from .truncation import svd_theta, decompose_theta_qr_based, TruncationError
 from ..linalg import random_matrix
 from ..tools.misc import consistency_check
 
-class XXZChain(CouplingModel,MPOModel):
+def local_expectation_values(psi, ops):
+    """Expectation values of several one-site operators on each site of a canonical MPS.
+
+    Equivalent to ``np.array([psi.expectation_value(op) for op in ops])``, but the one-site
+    wave function ``theta`` of each site is built only once and shared by all the `ops`.
+
+    Parameters
+    ----------
+    psi : :class:`~tenpy.networks.mps.MPS`
+        The state to measure, in canonical form.
+    ops : list of str
+        Names of one-site operators (without Jordan-Wigner string) defined on all sites.
+
+    Returns
+    -------
+    exp_vals : 2D array
+        ``exp_vals[a, i]`` is the expectation value of ``ops[a]`` on site `i`.
+    """
+    exp_vals = np.empty((len(ops), psi.L), dtype=np.complex128)
+    for i in range(psi.L):
+        theta = psi.get_theta(i, 1)
+        site = psi.sites[i]
+        for a, op_name in enumerate(ops):
+            op = site.get_op(op_name).replace_labels(['p', 'p*'], ['p0', 'p0*'])
+            C = npc.tensordot(op, theta, axes=['p0*', 'p0'])
+            exp_vals[a, i] = npc.inner(theta, C, axes='labels', do_conj=True)
+    return np.real_if_close(exp_vals)
+
+def allocate_data(n_meas, L):
+    """Preallocate the arrays filled by :func:`measurement` for `n_meas` measurements."""
+    return {'t': np.empty(n_meas),
+            'Sx': np.empty((n_meas, L)),
+            'Sy': np.empty((n_meas, L)),
+            'Sz': np.empty((n_meas, L)),
+            'entropy': np.empty((n_meas, L - 1)),
+            'trunc_err': np.empty(n_meas)}
+
+def measurement(eng, data, k):
+    """Store the measurements of the current state of `eng` in row `k` of `data`."""
+    data['t'][k] = eng.evolved_time
+    data['Sx'][k], data['Sy'][k], data['Sz'][k] = local_expectation_values(
+        eng.psi, ['Sigmax', 'Sigmay', 'Sigmaz'])
+    data['entropy'][k] = eng.psi.entanglement_entropy()
+    data['trunc_err'][k] = eng.trunc_err.eps
+    return data
+
+class PauliXXZChain(CouplingModel,MPOModel):
     def __init__(self, model_params):
 
         L = model_params['L']
@@ -62,19 +110,25 @@ class TEBDClifford():
         self.dt = config.dt
         self.order = config.order
         self.chi_max = config.chi_max
+        self.svd_min = config.svd_min
         self.dt = config.dt
         self.evol_time = config.evol_time
         self.conserve = config.conserve
+        self.N_steps = config.N_steps
+        # the Clifford gate is an npc.Array and can't be given on the command line:
+        # both are optional, with the same defaults as in TEBDEngine
+        self.clifford = getattr(config, 'clifford', None)
+        self.clifford_step = getattr(config, 'clifford_step', 10)
 
         # # Defining model
-        self.model = XXZChain(dict(bc=self.bc,
-                                   bc_mps=self.bc_MPS,
-                                   conserve=config.conserve,
-                                   L=self.L,
-                                   hz=self.hz,
-                                   Jxy=self.Jxy,
-                                   Jz=self.Jz,
-                                   bc_MPS=self.bc_MPS,))
+        self.model = PauliXXZChain(dict(bc=self.bc,
+                                        bc_mps=self.bc_MPS,
+                                        conserve=config.conserve,
+                                        L=self.L,
+                                        hz=self.hz,
+                                        Jxy=self.Jxy,
+                                        Jz=self.Jz,
+                                        bc_MPS=self.bc_MPS,))
         self.sites = self.model.lat.mps_sites()
         
         # Initial state
@@ -82,6 +136,8 @@ class TEBDClifford():
 
         # Saving directory
         self.saving_dir = config.saving_dir
+        # Data directory
+        self.data_dir_path = config.data_dir_path
         # Image directory
         self.img_dir_path = config.img_dir_path
         # Log directory
@@ -91,9 +147,27 @@ class TEBDClifford():
         self.logger = config.logger
 
     def run(self):
-        self.logger.info('Testing logger...')
+        """Run the TEBD evolution up to `evol_time`, measuring every `N_steps` time steps.
+
+        The measurements are written into preallocated arrays, saved to ``tebd_data.npz`` in the
+        data directory and returned as a dict.
+        """
+        tebd_params = {'N_steps': self.N_steps,
+                       'dt': self.dt,
+                       'order': self.order,
+                       'trunc_params': {'chi_max': self.chi_max, 'svd_min': self.svd_min}}
+        eng = tebd.TEBDEngine(self.psi, self.model, tebd_params,
+                              clifford=self.clifford, clifford_step=self.clifford_step)
+
+        n_meas = int(round(self.evol_time / (self.dt * self.N_steps))) + 1
+        data = allocate_data(n_meas, self.L)
+        measurement(eng, data, 0)
+        for k in range(1, n_meas):
+            eng.run()
+            measurement(eng, data, k)
+            self.logger.info('t = {0:.2f}, max chi = {1:d}'.format(eng.evolved_time, max(eng.psi.chi)))
+        for ax in 'xyz':
+            data['m' + ax] = data['S' + ax].sum(axis=1) / self.L
 
-        time = 0.
-        while time < self.evol_time:
-            print(time)
-            time += self.dt
\ No newline at end of file
+        np.savez(os.path.join(self.data_dir_path, 'tebd_data.npz'), **data)
+        return data
@@ -4,13 +4,16 @@ See the doc-string of :class:`Config` for details.
 """
 # Copyright (C) TeNPy Developers, GNU GPLv3
 
+import copyreg
+from collections.abc import ItemsView, ValuesView
 import warnings
 import numpy
 import numpy as np
 import numbers
-from collections.abc import MutableMapping
 import pprint
 import os
+import sys
+import weakref
 import logging
 logger = logging.getLogger(__name__)
 
@@ -18,12 +21,14 @@ from .hdf5_io import ATTR_FORMAT
 
 __all__ = ["Config", "asConfig", "load_yaml_with_py_eval"]
 
+_MISSING = object()  # sentinel to look up and check for keys in a single step
 
-class Config(MutableMapping):
-    """Dict-like wrapper class for parameter/configuration dictionaries.
 
-    This class behaves mostly like a dictionary of option keys/values (together making the whole
-    "config") with some additional features:
+class Config(dict):
+    """Dictionary subclass for parameter/configuration dictionaries.
+
+    This class is a dictionary of option keys/values (together making the whole "config") with
+    some additional features:
 
     - Logging of the options the first time they get used.
     - :meth:`get` acts more like :meth:`dict.setdefault` such that after the algorithm, all the
@@ -46,15 +51,75 @@ class Config(MutableMapping):
     name : str
         Name of the dictionary, for output statements. For example, when using
         a `Config` class for DMRG, ``name='DMRG'``.
-    options : dict
-        Dictionary containing the actual option keys and values.
     unused : set
-        Keeps track of any :attr:`options` not yet used.
+        Keeps track of any options not yet used.
+    _source : dict | None
+        The plain `config` dict `self` was initialized from. `self` holds a copy of the options,
+        but changes (e.g. used default values and subconfigs) are written through to `_source`,
+        such that it stays up to date for the caller who created it.
     """
+    __slots__ = ('unused', 'name', '_source', '_tracker', '__weakref__')
+
     def __init__(self, config, name):
-        self.options = config
-        self.unused = set(config.keys())
+        if isinstance(config, Config):
+            # copy the raw items: going through `__getitem__` would mark all options as used
+            dict.update(self, dict.items(config))
+        else:
+            dict.__init__(self, config)
+        self.unused = unused = set(config)
         self.name = name
+        self._source = config if type(config) is dict else None
+        self._tracker = None
+        if unused:
+            self._track_unused()
+
+    def __reduce__(self):
+        # The default reduction of a dict subclass sets the items before the attributes when
+        # unpickling, but `__setitem__` needs :attr:`unused`. Instead, restore everything in
+        # `__setstate__` without calling `__init__`, which would build a throw-away `unused` set.
+        return (copyreg.__newobj__, (self.__class__, ), self.__getstate__())
+
+    def __getstate__(self):
+        return {'options': self._raw_dict(), 'unused': self.unused, 'name': self.name}
+
+    def __setstate__(self, state):
+        dict.update(self, state['options'])
+        self.unused = state['unused']
+        self.name = state['name']
+        self._source = None
+        self._tracker = None
+        self._track_unused()
+
+    def _track_unused(self):
+        """(Re-)register the call of :meth:`warn_unused` for when `self` gets garbage collected.
+
+        Needs to be called whenever :attr:`unused` is replaced by a different set, and when keys
+        get added to an empty :attr:`unused` set without registered tracker.
+        We only register a tracker if there is anything to warn about, such that e.g. empty
+        (default) subconfigs don't need one.
+        """
+        tracker = self._tracker
+        if tracker is not None:
+            del _unused_trackers[id(tracker)]  # dropping the weakref disables its callback
+            tracker = None
+        if self.unused:
+            # a plain weakref with callback is much cheaper to create than `weakref.finalize`
+            tracker = weakref.ref(self, _warn_unused_collected)
+            _unused_trackers[id(tracker)] = (tracker, self.unused, self.name)
+        self._tracker = tracker
+
+    def _raw_dict(self):
+        """Plain dict copy of the options, *not* counting as read-out of the options."""
+        return dict(dict.items(self))
+
+    def _sync(self, key):
+        """Write the change of `key` through to :attr:`_source`."""
+        source = self._source
+        if source is not None:
+            if key in self:
+                source[key] = dict.__getitem__(self, key)
+            else:
+                source.pop(key, None)
 
     def copy(self, share_unused=True):
         """Make a *shallow* copy, as for a dictionary.
@@ -64,9 +129,13 @@ class Config(MutableMapping):
         share_unused : bool
             Whether the :attr:`unused` set should be shared.
         """
-        res = Config(self.options.copy(), self.name)
-        if share_unused:
-            res.unused = self.unused
+        res = Config.__new__(Config)  # bulk-copy the options without going through __init__
+        dict.update(res, dict.items(self))
+        res.name = self.name
+        res.unused = self.unused if share_unused else set(self)
+        res._source = None
+        res._tracker = None
+        res._track_unused()
         return res
 
     def as_dict(self):
@@ -74,7 +143,7 @@ class Config(MutableMapping):
 
         Subconfigs are recursively converted to dict.
         """
-        res = dict(self.options)
+        res = self._raw_dict()
         for k, v in res.items():
             if isinstance(v, Config):
                 res[k] = v.as_dict()
@@ -88,13 +157,14 @@ class Config(MutableMapping):
         filename : str
             Name of the resulting YAML file.
         """
-        import yaml
+        if yaml is None:
+            raise RuntimeError('Could not import yaml. Consider installing the pyyaml package.')
         with open(filename, 'w') as stream:
-            yaml.dump(self.as_dict(), stream)
+            yaml.dump(self.as_dict(), stream, Dumper=_YamlDumper)
 
     @classmethod
     def from_yaml(cls, filename, name=None):
-        """Load a `Config` instance from a YAML file containing the :attr:`options`.
+        """Load a `Config` instance from a YAML file containing the options.
 
         The yaml file can have additional ``!py_eval`` tags, see :func:`load_yaml_with_py_eval`.
 
@@ -138,7 +208,7 @@ class Config(MutableMapping):
         subpath : str
             The `name` of `h5gr` with a ``'/'`` in the end.
         """
-        type_repr = hdf5_saver.save_dict_content(self.options, h5gr, subpath)
+        type_repr = hdf5_saver.save_dict_content(self._raw_dict(), h5gr, subpath)
         h5gr.attrs[ATTR_FORMAT] = type_repr
         h5gr.attrs["name"] = self.name
         h5gr.attrs["unused"] = [str(u) for u in self.unused]
@@ -166,54 +236,103 @@ class Config(MutableMapping):
         dict_format = hdf5_loader.get_attr(h5gr, ATTR_FORMAT)
         obj = cls.__new__(cls)  # create class instance, no __init__() call
         hdf5_loader.memorize_load(h5gr, obj)
-        obj.options = hdf5_loader.load_dict(h5gr, dict_format, subpath)
+        dict.update(obj, hdf5_loader.load_dict(h5gr, dict_format, subpath))
         obj.name = hdf5_loader.get_attr(h5gr, "name")
         obj.unused = set(hdf5_loader.get_attr(h5gr, "unused"))
+        obj._source = None
+        obj._tracker = None
+        obj._track_unused()
         return obj
 
     def __getitem__(self, key):
-        val = self.options[key]
-        self.log(key, "reading")
-        self.unused.discard(key)
+        val = dict.__getitem__(self, key)
+        unused = self.unused
+        if key in unused:  # only the first read-out is logged
+            self.log(key, "reading")
+            unused.discard(key)
         return val
 
     def __setitem__(self, key, value):
-        if key not in self.options.keys():
+        if key not in self:
             self.unused.add(key)
-        self.options[key] = value
+            if self._tracker is None:
+                self._track_unused()
+        dict.__setitem__(self, key, value)
+        self._sync(key)
         self.log(key, "setting")
 
     def __delitem__(self, key):
         self.log(key, "deleting")
         self.unused.discard(key)
-        del self.options[key]
+        dict.__delitem__(self, key)
+        self._sync(key)
 
     def __iter__(self):
-        return iter(self.options)
-
-    def __len__(self):
-        return len(self.options)
+        # Overriding `__iter__` disables the C fast path of ``dict(self)`` and ``**self``, such
+        # that they go through `__getitem__` and mark the options as used.
+        return dict.__iter__(self)
+
+    def items(self):
+        """Same as :meth:`dict.items`, but reading the values marks them as used."""
+        return ItemsView(self)
+
+    def values(self):
+        """Same as :meth:`dict.values`, but reading the values marks them as used."""
+        return ValuesView(self)
+
+    def clear(self):
+        """Same as :meth:`dict.clear`, but also update :attr:`unused`."""
+        for key in list(dict.keys(self)):
+            del self[key]
+
+    def popitem(self):
+        """Same as :meth:`dict.popitem`, but also remove the key from :attr:`unused`."""
+        key, val = dict.popitem(self)
+        self.log(key, "deleting")
+        self.unused.discard(key)
+        self._sync(key)
+        return key, val
 
     def __str__(self):
         res = "Config, name={0!r}, options:\n".format(self.name)
-        res += pprint.pformat(self.options)
+        options = self._raw_dict()
+        if len(options) <= 8:
+            res += repr(options)  # fits in a line or two anyways
+        else:
+            res += pprint.pformat(options, compact=True, width=120)
         return res
 
     def __repr__(self):
-        return "Config(<{0:d} options>, {1!r})".format(len(self.options), self.name)
-
-    def __del__(self):
-        self.warn_unused()
+        return "Config(<{0:d} options>, {1!r})".format(len(self), self.name)
 
     def __ior__(self, other):
         self.update(other)
         return self
 
+    def update(self, other=(), **kwargs):
+        """Same as :meth:`dict.update`, but set each item with ``self[key] = value``.
+
+        This keeps track of new keys in :attr:`unused`.
+        """
+        if hasattr(other, 'keys'):
+            other = [(key, other[key]) for key in other.keys()]
+        for key, value in other:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        """Same as :meth:`dict.pop`, but also remove `key` from :attr:`unused`."""
+        self.unused.discard(key)
+        val = dict.pop(self, key, *default)
+        self._sync(key)
+        return val
+
     def warn_unused(self, recursive=False):
         """Warn about (so far) unused options.
 
         This can help to detect typos in the option keys.
-        It is automatically called upon deletion of `self`,
+        It is automatically called (with a weakref callback) upon deletion of `self`,
         but this might be a bit later than you intended.
 
         Parameters
@@ -224,21 +343,12 @@ class Config(MutableMapping):
         unused = getattr(self, 'unused', None)
         if unused is None:
             return
-        if len(unused) > 0:
-            if len(unused) > 1:
-                msg = "unused options for config {name!s}:\n{keys!s}"
-            else:
-                msg = "unused option {keys!s} for config {name!s}"
-            warnings.warn(msg.format(keys=sorted(unused), name=self.name))
-            self.unused.clear()  # don't warn twice about the same parameters
+        _warn_unused(unused, self.name)
         if recursive:
-            for val in self.options.values():
+            for val in dict.values(self):
                 if isinstance(val, Config):
                     val.warn_unused(True)
 
-    def keys(self):
-        return self.options.keys()
-
     def get(self, key, default, expect_type=None):
         """Find the value of `key`; really more like `setdefault` of a :class:`dict`.
 
@@ -267,10 +377,16 @@ class Config(MutableMapping):
         val :
             The value for `option` if it existed, `default` otherwise.
         """
-        use_default = key not in self.options.keys()
-        val = self.options.setdefault(key, default)  # get & set default if not existent
-        self.log(key, "reading", use_default)
-        self.unused.discard(key)  # (does nothing if key not in set)
+        val = dict.get(self, key, _MISSING)
+        use_default = val is _MISSING
+        if use_default:  # set default if not existent
+            val = default
+            dict.__setitem__(self, key, val)
+            self._sync(key)
+        unused = self.unused
+        if use_default or key in unused:
+            self.log(key, "reading", use_default)
+            unused.discard(key)
         if (expect_type is not None) and (val is not None):  # (val is None) => nothing to check
             # convert to sequence
             if expect_type == 'real':
@@ -313,7 +429,7 @@ class Config(MutableMapping):
         memorizing/logging the access.
         Does not count as read-out for the :attr:`unused` parameters.
         """
-        return self.options.get(key, default)
+        return dict.get(self, key, default)
 
     def setdefault(self, key, default):
         """Set a default value without reading it out.
@@ -325,26 +441,33 @@ class Config(MutableMapping):
         default :
             The value to be set by default if the option is not yet set.
         """
-        use_default = key not in self.keys()
-        self.options.setdefault(key, default)
-        self.log(key, "set default", not use_default)
-        self.unused.discard(key)  # (does nothing if key not in set)
+        use_default = dict.get(self, key, _MISSING) is _MISSING
+        if use_default:
+            dict.__setitem__(self, key, default)
+            self._sync(key)
+        unused = self.unused
+        if not use_default or key in unused:
+            self.log(key, "set default", not use_default)
+            unused.discard(key)
         # do no return the value: not added to self.unused!
 
     def subconfig(self, key, default=None):
         """Get ``self[key]`` as a :class:`Config`."""
-        use_default = key not in self.keys()
+        val = dict.get(self, key, _MISSING)
+        use_default = val is _MISSING
         if use_default:
             if default is None:
-                subconfig = {}
+                val = {}
             else:
-                subconfig = default.copy()
-        else:
-            subconfig = self.options[key]
-        subconfig = asConfig(subconfig, key)
-        self.options[key] = subconfig
-        self.log(key, "subconfig", use_default)
-        self.unused.discard(key)  # (does nothing if key not in set)
+                val = default.copy()
+        subconfig = asConfig(val, key)
+        if use_default or subconfig is not val:
+            dict.__setitem__(self, key, subconfig)
+            self._sync(key)
+        unused = self.unused
+        if use_default or key in unused:
+            self.log(key, "subconfig", use_default)
+            unused.discard(key)
         return subconfig
 
     def touch(self, *keys):
@@ -368,25 +491,32 @@ class Config(MutableMapping):
         action : str, optional
             Use to adapt log message to specific actions (e.g. "Deleting")
         """
-        name = self.name
-        new_key = option in self.unused or use_default
-        val = self.options.get(option, "<not set>")
-        if new_key:
-            if use_default:
-                logger.debug("%s: %s %r=%r (default)", name, action, option, val)
-            else:
-                logger.info("%s: %s %r=%r", name, action, option, val)
+        if not use_default and option not in self.unused:
+            return  # fast path: only log new keys
+        val = dict.get(self, option, "<not set>")
+        if use_default:
+            logger.debug("%s: %s %r=%r (default)", self.name, action, option, val)
+        else:
+            logger.info("%s: %s %r=%r", self.name, action, option, val)
 
     def deprecated_alias(self, old_key, new_key, extra_msg=""):
-        if old_key in self.options.keys():
-            msg = "Deprecated option in {name!r}: {old!r} renamed to {new!r}"
-            msg = msg.format(name=self.name, old=old_key, new=new_key)
-            if extra_msg:
-                msg = '\n'.join(msg, extra_msg)
-            warnings.warn(msg, FutureWarning, stacklevel=3)
-            self.options[new_key] = self.options[old_key]
-            self.unused.discard(old_key)
-            self.unused.add(new_key)
+        """Rename the option `old_key` to `new_key` (if present) with a ``FutureWarning``."""
+        val = dict.pop(self, old_key, _MISSING)
+        if val is _MISSING:
+            return
+        msg = "Deprecated option in {name!r}: {old!r} renamed to {new!r}"
+        msg = msg.format(name=self.name, old=old_key, new=new_key)
+        if extra_msg:
+            msg = '\n'.join([msg, extra_msg])
+        warnings.warn(msg, FutureWarning, stacklevel=3)
+        dict.__setitem__(self, new_key, val)
+        self._sync(old_key)
+        self._sync(new_key)
+        unused = self.unused
+        unused.discard(old_key)
+        unused.add(new_key)
+        if self._tracker is None:
+            self._track_unused()
 
     def any_nonzero(self, keys, log_msg=None):
         """Check for any non-zero or non-equal entries in some parameters.
@@ -407,27 +537,28 @@ class Config(MutableMapping):
             True, if any of the ``self[key]`` for single `key` in `keys`,
             or if any of the entries for a tuple of `keys`
         """
+        has_nonzero = self.has_nonzero
         for k in keys:
             if isinstance(k, tuple):
                 if len(k) == 0:
                     raise ValueError("got empty tuple, nothing to compare")
                 # check equality
-                nonzero = [self.has_nonzero(k0) for k0 in k]
+                nonzero = [has_nonzero(k0) for k0 in k]
                 if not any(nonzero):
                     continue  # all zero, so equal
                 if not all(nonzero):
                     if log_msg is not None:
                         logger.debug("%s: %r would need to be equal", log_msg, k)
                     return True
-                val = self.options[k[0]]
+                # all keys exist, since they have nonzero entries
+                val = dict.__getitem__(self, k[0])
                 for k1 in k[1:]:
-                    other_val = self.options[k1]
-                    if not np.array_equal(val, other_val):
+                    if not np.array_equal(val, dict.__getitem__(self, k1)):
                         if log_msg is not None:
                             logger.debug("%s: %r and %r have different entries", log_msg, k, k1)
                         return True
             else:
-                if self.has_nonzero(k):
+                if has_nonzero(k):
                     if log_msg is not None:
                         logger.debug("%s: %r as nonzero entries", log_msg, k)
                     return True
@@ -446,8 +577,41 @@ class Config(MutableMapping):
         bool
             True if `self` has key `key` with a nontrivial value. False otherwise.
         """
-        return (key in self.keys() and self.options[key] is not None
-                and np.any(np.array(self.options[key])) != 0)
+        val = dict.get(self, key, None)
+        if val is None:
+            return False
+        if isinstance(val, (int, float, complex)):  # fast path for scalars (including bool)
+            return bool(val != 0)
+        if isinstance(val, np.ndarray):
+            return bool(np.any(val != 0))
+        return bool(np.any(np.asarray(val) != 0))
+
+
+#: id(tracker) -> (tracker, unused, name) for the weakref `tracker` of each :class:`Config`
+#: which needs to warn about unused options once it gets collected, see `Config._track_unused`.
+#: Keeping `unused` and `name` here avoids keeping the `Config` alive.
+_unused_trackers = {}
+
+
+def _warn_unused_collected(tracker):
+    """Weakref callback warning about the unused options of a garbage collected :class:`Config`."""
+    _, unused, name = _unused_trackers.pop(id(tracker))
+    _warn_unused(unused, name)
+
+
+def _warn_unused(unused, name):
+    """Warn about the keys in the set `unused` and clear it; used by :meth:`Config.warn_unused`."""
+    n = len(unused)
+    if n == 0:
+        return
+    if n == 1:
+        keys = "[{0!r}]".format(next(iter(unused)))  # same as for a list, but no need to sort
+        msg = "unused option {keys!s} for config {name!s}"
+    else:
+        keys = sorted(unused)
+        msg = "unused options for config {name!s}:\n{keys!s}"
+    warnings.warn(msg.format(keys=keys, name=name))
+    unused.clear()  # don't warn twice about the same parameters
 
 
 def asConfig(config, name):
@@ -492,8 +656,14 @@ except ImportError:
 
 if yaml is None:
     _YamlLoaderWithPyEval = None
+    _YamlDumper = None
 else:
-    class _YamlLoaderWithPyEval(yaml.FullLoader):
+    # use the (much faster) C implementations based on libyaml, if available.
+    # Not the `Safe` versions: we need to support tuples and the `!py_eval` tag.
+    _YamlFullLoader = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+    _YamlDumper = getattr(yaml, 'CDumper', yaml.Dumper)
+
+    class _YamlLoaderWithPyEval(_YamlFullLoader):
         eval_context = {}
 
     yaml.add_constructor("!py_eval", _yaml_eval_constructor, Loader=_YamlLoaderWithPyEval)
@@ -558,4 +728,15 @@ def load_yaml_with_py_eval(filename=None, yaml_content=None, context={'np': nump
         config = yaml.load(yaml_content, Loader=_YamlLoaderWithPyEval)
     else:
         raise ValueError("pass either filename or yaml_content!")
-    return config
+    return _intern_keys(config)
+
+
+def _intern_keys(data):
+    """Intern the string keys of (nested) dictionaries loaded from a file.
+
+    Option keys in the code are string literals, which are interned already; this makes the
+    dictionary lookups with the loaded keys hit the fast identity check.
+    """
+    if type(data) is not dict:
+        return data
+    return {(sys.intern(k) if type(k) is str else k): _intern_keys(v) for k, v in data.items()}
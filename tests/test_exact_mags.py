@@ -0,0 +1,61 @@
+"""Check the exact diagonalization helpers in src/utils.py against qiskit."""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+pytest.importorskip('qiskit')
+from qiskit.quantum_info import SparsePauliOp
+from scipy.linalg import eigh
+
+from src import utils
+
+use_numba_params = [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(utils.numba is None, reason="needs numba")),
+]
+
+
+def pauli_reference(psi_t, pauli, qubit, L):
+    op = SparsePauliOp.from_sparse_list([(pauli, [qubit], 1.)], num_qubits=L).to_matrix()
+    return np.einsum('ti,ij,tj->t', psi_t.conj(), op, psi_t).real
+
+
+def test_heisenberg_csr(L=4, Jxy=-0.1, Jz=-0.5, hz=0.7):
+    graph = utils.get_line_graph(L)
+    H_qiskit = utils.get_heisenberg_hamiltonian(graph, Jxy, Jz, hz).to_matrix()
+    npt.assert_allclose(utils.heisenberg_csr(L, Jxy, Jz, hz).toarray(), H_qiskit, atol=1.e-14)
+
+
+@pytest.mark.parametrize('use_numba', use_numba_params)
+def test_site_pauli_kernels(use_numba, L=4):
+    rng = np.random.default_rng(5)
+    psi_t = rng.normal(size=(3, 2**L)) + 1.j * rng.normal(size=(3, 2**L))
+    psi_t /= np.linalg.norm(psi_t, axis=1, keepdims=True)
+    masks = utils.site_pauli_masks(L)
+    idx = np.arange(2**L)
+    for pauli in 'XYZ':
+        for qubit in range(L):
+            if use_numba:
+                mask_array = np.array([masks[(pauli, qubit)]], dtype=np.int64)
+                val = utils._pauli_expvals_numba(psi_t, mask_array)[0]
+            else:
+                val = utils._pauli_expval_numpy(psi_t, psi_t.conj(), idx, *masks[(pauli, qubit)])
+            npt.assert_allclose(val, pauli_reference(psi_t, pauli, qubit, L), atol=1.e-13)
+
+
+@pytest.mark.parametrize('use_numba', use_numba_params)
+def test_get_exact_mags(monkeypatch, use_numba, L=4, Jxy=-0.1, Jz=-0.5, hz=0.7):
+    if not use_numba:
+        monkeypatch.setattr(utils, '_pauli_expvals_numba', None)
+    times, mx, my, mz = utils.get_exact_mags(L, Jxy, Jz, hz, single_precision=False)
+    # reference: dense evolution of |+>^L with the qiskit Hamiltonian
+    H = utils.get_heisenberg_hamiltonian(utils.get_line_graph(L), Jxy, Jz, hz).to_matrix()
+    E, U = eigh(H)
+    psi0 = np.full(2**L, 2**(-L / 2), dtype=complex)
+    psi_t = (np.exp(-1.j * np.outer(times, E)) * (U.conj().T @ psi0)) @ U.T
+    for pauli, mag in zip('XYZ', [mx, my, mz]):
+        expected = sum(pauli_reference(psi_t, pauli, qubit, L) for qubit in range(L)) / L
+        npt.assert_allclose(mag, expected, atol=1.e-10)
+    _, mx_single, _, _ = utils.get_exact_mags(L, Jxy, Jz, hz, single_precision=True)
+    npt.assert_allclose(mx_single, mx, atol=1.e-5)
@@ -25,7 +25,9 @@ def test_parameters():
     )
     pars_copy = copy.deepcopy(pars)
     config = asConfig(pars, "Test parameters")
+    assert isinstance(config, dict)
     example_function(config)
+    assert pars['c'] == 2  # used default is written through to the original dict
     assert config['d'] == "dict-style access"  # reads out d
     pars_copy['c'] = 2
     assert config.as_dict() == pars_copy
@@ -59,6 +61,30 @@ def test_parameters():
     with pytest.warns(FutureWarning, match="Deprecated option in 'sub': 'y' renamed to 'y_new'"):
         sub.deprecated_alias('y', 'y_new')
     assert len(sub.unused) == 2
-    with pytest.warns(UserWarning, match=r"unused options for config sub:\n\['x', 'y_new'\]"):
-        sub.__del__()
+    assert 'y' not in sub
+    with pytest.warns(FutureWarning, match="renamed to 'x_new'\nsee docs"):
+        sub.deprecated_alias('x', 'x_new', "see docs")
+    sub.deprecated_alias('x', 'x_new')  # no-op
+    with pytest.warns(UserWarning, match=r"unused options for config sub:\n\['x_new', 'y_new'\]"):
+        sub.warn_unused()
 
+
+def test_config_dict_methods():
+    pars = {'a': 1, 'b': 2, 'c': 3}
+    config = Config(pars, "dict methods")
+    assert dict(**config) == pars  # counts as reading out all options
+    assert len(config.unused) == 0
+    config = Config(pars, "dict methods")
+    assert sorted(config.values()) == [1, 2, 3]
+    assert len(config.unused) == 0
+    config = Config(pars, "dict methods")
+    assert list(config.keys()) == ['a', 'b', 'c']  # does not count as reading out
+    assert config.popitem() == ('c', 3)
+    assert config.unused == {'a', 'b'} and pars == {'a': 1, 'b': 2}
+    config.clear()
+    assert len(config.unused) == 0 and pars == {}
+    other = Config({'a': 1, 'b': 2}, "source")
+    copied = Config(other, "copy")  # doesn't count as reading out the options of `other`
+    assert other.unused == {'a', 'b'} and copied.unused == {'a', 'b'}
+    other.touch('a', 'b')
+    copied.touch('a', 'b')
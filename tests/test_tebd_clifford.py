@@ -0,0 +1,17 @@
+"""A collection of tests for :mod:`tenpy.algorithms.tebd_clifford`."""
+# Copyright (C) TeNPy Developers, GNU GPLv3
+
+import numpy.testing as npt
+from tenpy.algorithms.tebd_clifford import local_expectation_values
+
+from random_test import random_MPS
+
+
+def test_local_expectation_values():
+    psi = random_MPS(6, 2, 4)
+    assert max(psi.chi) > 1
+    ops = ['D', 'h', 'Id']
+    exp_vals = local_expectation_values(psi, ops)
+    assert exp_vals.shape == (len(ops), psi.L)
+    for a, op in enumerate(ops):
+        npt.assert_allclose(exp_vals[a], psi.expectation_value(op), rtol=1.e-12, atol=1.e-14)
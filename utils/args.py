@@ -1,9 +1,11 @@
 import argparse
 
+_TRUE = frozenset({'true', '1', 'yes', 't', 'y'})
+
 def str2bool(v):
-    return v.lower() in ['true']
+    return v.lower() in _TRUE
 
-def get_config():
+def _build_parser():
     parser = argparse.ArgumentParser()
 
     # Physical System configurations
@@ -18,8 +20,10 @@ def get_config():
     parser.add_argument('--dt', type=float, default=0.1, help='Trotterization time step')
     parser.add_argument('--order', type=int, default=4, help='Trotterization order, can be 1 to 4')
     parser.add_argument('--chi_max', type=int, default=100, help='Maximum bond dimension, where the cutoff is made')
-    parser.add_argument('--svd_max', type=int, default=1.e-12, help='Precision for the SVD calculation')
+    parser.add_argument('--svd_min', '--svd_max', dest='svd_min', type=float, default=1.e-12, help='Precision for the SVD calculation (--svd_max is the old name)')
     parser.add_argument('--evol_time', type=float, default=20., help='Total evolution time')
+    parser.add_argument('--N_steps', type=int, default=1, help='Number of TEBD steps between two measurements')
+    parser.add_argument('--clifford_step', type=int, default=10, help='Number of TEBD steps between two Clifford gates')
     parser.add_argument('--conserve', type=str, default='None', help='Conserved charge, can be None or Sz')
 
 
@@ -28,6 +32,10 @@ def get_config():
     
     # Logger
     parser.add_argument('--logger', type=object, default=None, help='logger object')
-    config = parser.parse_args()
 
-    return config
\ No newline at end of file
+    return parser
+
+_PARSER = _build_parser()
+
+def get_config(argv=None):
+    return _PARSER.parse_args(argv)